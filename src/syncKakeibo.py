@@ -125,6 +125,16 @@ class ExpenseItem:
         else:
             return -1
 
+    # 家計簿アプリ上の費目名から費目IDを得るためのmapを取得する
+    @classmethod
+    def getKakeiboNameToIdMap(cls):
+
+        # 初回呼び出し時にインデックス生成
+        if len(cls.himokuCBToIDMap) == 0:
+            cls.initTable()
+
+        return cls.himokuCBToIDMap
+
     # 費目IDからChangeLogメモ上の費目名を得る
     @classmethod
     def getCLMemoName(cls, himokuId):
@@ -189,6 +199,9 @@ class CashItem:
 
 class CashBook:
 
+    # cashbook_all.csvのヘッダ
+    expectedHeader = [ "No","日付","収入","支出","費目名","収支区分","メモ","帳簿コード","支払コード","請求日&支払回数","請求No","送金元orチャージ" ]
+
     def __init__(self):
         self.items = []
 
@@ -201,41 +214,59 @@ class CashBook:
 
         with open(filePath, "r", encoding='utf-8') as f:
 
-            expected_header = [ "No","日付","収入","支出","費目名","収支区分","メモ","帳簿コード","支払コード","請求日&支払回数","請求No","送金元orチャージ" ]
-
             reader = csv.reader(f)
-        
-            for index,columns in enumerate(reader):
-
-                if index == 0:
-                    # 1行目の場合はヘッダ名の確認
-                    if len(columns) != 12:
-                        print(f"Error: 意図しないヘッダ構成(12列でない)")
-                        return False
-
-                    for expect, actual in zip(expected_header, columns):
-                        if expect != actual:
-                            print(f"Error: 意図しないヘッダ構成 expect:{expect} actual:{actual}")
-                            return False
+
+            # 1行目はヘッダ名の確認
+            if self.checkHeader(next(reader, [])) == False:
+                return False
+
+            # 2行目以降を読む
+            # (行ごとに繰り返し参照するものはローカル変数に束縛しておく)
+            lookup = ExpenseItem.getKakeiboNameToIdMap().get
+            appendItem = self.items.append
+
+            for columns in reader:
+
+                if len(columns) != 12:
+                    if len(columns) > 0:
+                        print(f'Warning: Line.{self.getStartLineNo(reader, columns)} [家計簿アプリ側]想定しない形式のため無視します {columns}')
+                    continue
+
+                himokuId = lookup(columns[4], -1)
+                if himokuId == -1:
+                    print(f'Warning: Line.{self.getStartLineNo(reader, columns)} [家計簿アプリ側]不明な費目のため無視します {columns[4]}')
+                    continue
+
+                if columns[5] == '支出':
+                    amount = int(columns[3])
                 else:
-                    # 2行目以降を読む(1行目はヘッダのため読み飛ばす)
-                    date = columns[1]
-                    himokuId = ExpenseItem.getIdFromKakeiboName(columns[4])
-                    if himokuId == -1:
-                        print(f'Warning: Line.{index+1} [家計簿アプリ側]不明な費目のため無視します {columns[4]}')
-                        continue
+                    amount = -(int(columns[2]))
 
-                    if columns[5] == '支出':
-                        amount = int(columns[3])
-                    else:
-                        amount = -(int(columns[2]))
+                appendItem(CashItem(columns[1], himokuId, amount, columns[6]))
 
-                    brief = columns[6]
+        return True
+
+    # ヘッダ行が想定通りかを確認する
+    @classmethod
+    def checkHeader(cls, columns):
 
-                    self.items.append(CashItem(date, himokuId, amount, brief))
+        if len(columns) != 12:
+            print(f"Error: 意図しないヘッダ構成(12列でない)")
+            return False
+
+        for expect, actual in zip(cls.expectedHeader, columns):
+            if expect != actual:
+                print(f"Error: 意図しないヘッダ構成 expect:{expect} actual:{actual}")
+                return False
 
         return True
 
+    # 直前に読んだデータ行の先頭の行番号を得る
+    # (列内に改行を含む場合、reader.line_numはデータ行の末尾の行番号になるため)
+    @classmethod
+    def getStartLineNo(cls, reader, columns):
+        return reader.line_num - sum(column.count('\n') for column in columns)
+
     @classmethod
     def saveAllItems(cls, items, filePath):
 
@@ -533,6 +564,47 @@ class BuyLog:
     def getMergedItems(self):
       return self.mergedItems
 
+# 日付ごとの件数と金額合計を扱うクラス
+class DailySummary:
+
+    def __init__(self):
+
+        # 日付別の[件数, 金額合計]
+        self.summaryPerDate = {}
+
+    # 追加
+    def append(self, items):
+
+        for item in items:
+
+            date = item.getDate()
+            if date in self.summaryPerDate:
+                summary = self.summaryPerDate[date]
+                summary[0] += 1
+                summary[1] += item.getAmount()
+            else:
+                self.summaryPerDate[date] = [ 1, item.getAmount() ]
+
+    # 指定した日付の件数と金額合計を取得する
+    def getSummaryAt(self, date):
+
+        if date in self.summaryPerDate:
+            return tuple(self.summaryPerDate[date])
+        else:
+            return (0, 0)
+
+    # 件数または金額合計が一致しない日付のリストを取得する
+    def getMismatchDates(self, other):
+
+        result = []
+
+        for date in set(self.summaryPerDate) | set(other.summaryPerDate):
+            if self.getSummaryAt(date) != other.getSummaryAt(date):
+                result.append(date)
+
+        result.sort()
+        return result
+
 class Memo:
     def __init__(self, memofile):
         self.items = []
@@ -624,6 +696,102 @@ def syncKakeibo(args):
     print("Updateing cashbook_all.csv...")
     CashBook.saveAllItems(buyLog.getMergedItems(), conf.getCashBookAllFilePath())
 
+    # 同期後の照合(--detailは--verifyを含む)
+    if args.verify or args.detail:
+        return verifyKakeibo(args)
+
+# 不一致の日付について、片側にしか存在しないアイテムを出力する
+def printMismatchDetail(cashBookItems, memoItems):
+
+    # 同一アイテムは互いに打ち消し、残ったものを差分とする
+    counts = {}
+    for item in cashBookItems:
+        keystr = item.getHash()
+        counts[keystr] = counts.get(keystr, 0) + 1
+    for item in memoItems:
+        keystr = item.getHash()
+        counts[keystr] = counts.get(keystr, 0) - 1
+
+    for item in cashBookItems:
+        keystr = item.getHash()
+        if counts[keystr] > 0:
+            counts[keystr] -= 1
+            print(f"    [家計簿アプリ側のみ] {item.getHimokuCLMemoName()} {item.getBrief()} {item.getAmount()}")
+    for item in memoItems:
+        keystr = item.getHash()
+        if counts[keystr] < 0:
+            counts[keystr] += 1
+            print(f"    [買い物ログ側のみ] {item.getHimokuCLMemoName()} {item.getBrief()} {item.getAmount()}")
+
+# 指定した日付のアイテムだけを日付別のリストにまとめる
+def groupItemsByDate(items, dates):
+
+    result = { date: [] for date in dates }
+
+    for item in items:
+        date = item.getDate()
+        if date in result:
+            result[date].append(item)
+
+    return result
+
+# cashbook_all.csvとChangeLogメモの買い物ログとの間で、日付ごとの件数と金額合計を照合する
+def verifyKakeibo(args):
+    conf = SyncKakeiboConfig()
+
+    # ChangeLogメモ置き場の有無を確認
+    baseDir = conf.getChangeLogMemoDir()
+    if os.path.isdir(baseDir) == False:
+        print(f"Error: ChangeLogメモフォルダ {baseDir} が存在しません")
+        return 1
+
+    # かけーぼ置き場の有無を確認
+    kakeiboDir = conf.getKakeiboDir()
+    if os.path.isdir(kakeiboDir) == False:
+        print(f"Error: かけーぼ同期フォルダ {kakeiboDir} が存在しません")
+        return 1
+
+    # かけーぼのCSVを読む
+    print("Loading CSV...")
+    cashBook = CashBook()
+    if cashBook.load(conf.getCashBookAllFilePath()) == False:
+        return 1
+
+    # ChangeLogメモから買い物ログデータを抽出
+    changeLogMemoFilePath = conf.getChangeLogMemoFilePath()
+    print(f"Loading ChangeLogMemo {changeLogMemoFilePath} ...")
+    buyLogOnMemo = ChangeLogMemo()
+    buyLogOnMemo.loadBuyLog(changeLogMemoFilePath)
+
+    # 日付ごとに集計して照合する
+    print("Verifying...")
+    cashBookSummary = DailySummary()
+    cashBookSummary.append(cashBook.getItems())
+    memoSummary = DailySummary()
+    memoSummary.append(buyLogOnMemo.getItems())
+
+    mismatchDates = cashBookSummary.getMismatchDates(memoSummary)
+
+    # 詳細表示する場合は、不一致の日付についてのみアイテムを集める
+    if args.detail:
+        cashBookItemsPerDate = groupItemsByDate(cashBook.getItems(), mismatchDates)
+        memoItemsPerDate = groupItemsByDate(buyLogOnMemo.getItems(), mismatchDates)
+
+    for date in mismatchDates:
+        cashBookCount, cashBookTotal = cashBookSummary.getSummaryAt(date)
+        memoCount, memoTotal = memoSummary.getSummaryAt(date)
+        print(f"Mismatch: {date} 家計簿アプリ側:{cashBookCount}件 {cashBookTotal}円 買い物ログ側:{memoCount}件 {memoTotal}円")
+
+        if args.detail:
+            printMismatchDetail(cashBookItemsPerDate[date], memoItemsPerDate[date])
+
+    if len(mismatchDates) > 0:
+        print(f"Error: {len(mismatchDates)}日分のデータが一致しません")
+        return 1
+
+    print("OK: 全期間のデータが一致しました")
+    return 0
+
 def importMemo(args):
 
     conf = SyncKakeiboConfig()
@@ -663,6 +831,8 @@ def main():
     subparsers = parser.add_subparsers()
     # syncコマンドの定義
     parser1 = subparsers.add_parser('sync', help='家計簿アプリとの同期を行います')
+    parser1.add_argument('--verify', action='store_true', help='同期後に家計簿アプリと買い物ログの照合を行います')
+    parser1.add_argument('--detail', action='store_true', help='照合で不一致だった日付のアイテムを表示します(--verifyを含む)')
     parser1.set_defaults(handler=syncKakeibo)
 
     # importコマンドの定義
@@ -670,9 +840,14 @@ def main():
     parser2.add_argument('memofile', help='メモファイルのパス')
     parser2.set_defaults(handler=importMemo)
 
+    # verifyコマンドの定義
+    parser3 = subparsers.add_parser('verify', help='家計簿アプリと買い物ログの内容が一致しているかを日付ごとに照合します')
+    parser3.add_argument('--detail', action='store_true', help='不一致だった日付のアイテムを表示します')
+    parser3.set_defaults(handler=verifyKakeibo)
+
     args = parser.parse_args()
     if hasattr(args, 'handler'):
-        args.handler(args)
+        sys.exit(args.handler(args))
     else:
         parser.print_help()
 